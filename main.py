@@ -5,50 +5,47 @@ and add and remove lines, as well as view and reset the visualized graph.
 """
 if __name__ in {"__main__", "__mp_main__"}:
     import transit_map
-    from map_visualization import visualize_graph
+    from map_visualization import trace_arrays, visualize_graph
     import os
+    from typing import Any, Optional
     from nicegui import ui
     from plotly.graph_objs import Figure
 
     subway_graph = transit_map.load_subway_map('subway.csv', 'subway_lines.csv')
 
-    def add_station(graph: transit_map.Graph, inputs: dict[str, list[str]]) -> None:
+    def add_station(graph: transit_map.Graph, inputs: dict[str, Any]) -> None:
         if inputs['Name']:
-            name = inputs['Name'][len(inputs['Name']) - 1]
+            name = inputs['Name']
             if inputs['Neighbours'] and 'No Stations' not in inputs['Neighbours']:
-                neighbours = {neighbour for neighbour in inputs['Neighbours']
-                              if neighbour in {v.item for v in graph.get_all_vertices(set())}}
+                neighbours = inputs['Neighbours'].keys() & graph.vertex_items()
             else:
                 neighbours = set()
             if inputs['Lines'] and 'No Lines' not in inputs['Lines']:
-                lines = {line for line in inputs['Lines']
-                         if line in graph.get_all_lines()}
+                lines = inputs['Lines'].keys() & graph.line_names()
             else:
                 lines = set()
             graph.add_station(name, neighbours, lines)
             update_graph(graph)
             refresh_add_station()
 
-    def remove_station(graph: transit_map.Graph, station: str) -> None:
-        if station in {v.item for v in graph.get_all_vertices(set())}:
+    def remove_station(graph: transit_map.Graph, station: Optional[str]) -> None:
+        if station in graph.vertex_items():
             graph.remove_station(station)
             update_graph(graph)
             refresh_remove_station()
 
-    def add_line(graph: transit_map.Graph, inputs: dict[str, list[str]]) -> None:
-        if inputs['Name']:
-            name = inputs['Name'][len(inputs['Name']) - 1]
-            if inputs['Stations']:
-                stations = [station for station in inputs['Stations']
-                            if station in {v.item for v in graph.get_all_vertices(set())}]
-            else:
-                stations = set()
-            graph.add_line(name, stations)
-            update_graph(graph)
-            refresh_add_line()
-
-    def remove_line(graph: transit_map.Graph, line: str) -> None:
-        if line in graph.get_all_lines():
+    def add_line(graph: transit_map.Graph, inputs: dict[str, Any]) -> None:
+        if inputs['Name'] and inputs['Stations']:
+            name = inputs['Name']
+            all_stations = graph.vertex_items()
+            stations = [station for station in inputs['Stations'] if station in all_stations]
+            if stations:
+                graph.add_line(name, stations)
+                update_graph(graph)
+                refresh_add_line()
+
+    def remove_line(graph: transit_map.Graph, line: Optional[str]) -> None:
+        if line in graph.line_names():
             graph.remove_line(line)
             update_graph(graph)
             refresh_remove_line()
@@ -58,16 +55,36 @@ if __name__ in {"__main__", "__mp_main__"}:
         subway_graph = transit_map.load_subway_map('subway.csv', 'subway_lines.csv')
         update_graph(subway_graph)
 
+    # Redraws requested by update_graph are coalesced, then applied at most once per tick of the redraw timer,
+    # so a burst of edits only redraws the map and its select menus once.
+    pending_redraw = {'graph': None}
+
     def update_graph(g: transit_map.Graph = subway_graph) -> None:
-        fig.data = []
-        for trace in visualize_graph(g):
-            fig.add_trace(trace)
-        fig.update_layout(
-            {'showlegend': False},
-            margin=dict(l=5, r=20, t=20, b=20),
-        )
-        fig.update_xaxes(showgrid=False, zeroline=False, visible=False)
-        fig.update_yaxes(showgrid=False, zeroline=False, visible=False)
+        pending_redraw['graph'] = g
+
+    def redraw_graph() -> None:
+        g = pending_redraw['graph']
+        if g is None:
+            return
+        pending_redraw['graph'] = None
+
+        # The figure keeps its edge and node traces; only their data is replaced.
+        x_edges, y_edges, x_values, y_values, colours, labels = trace_arrays(g)
+        with fig.batch_update():
+            edge_trace, node_trace = fig.data
+            edge_trace.x = x_edges
+            edge_trace.y = y_edges
+            node_trace.x = x_values
+            node_trace.y = y_values
+            node_trace.marker.color = colours
+            node_trace.marker.line.color = colours
+            node_trace.text = labels
+            fig.update_layout(
+                {'showlegend': False},
+                margin=dict(l=5, r=20, t=20, b=20),
+            )
+            fig.update_xaxes(showgrid=False, zeroline=False, visible=False)
+            fig.update_yaxes(showgrid=False, zeroline=False, visible=False)
         plot.update()
 
         select_neighbours.refresh()
@@ -149,56 +166,57 @@ if __name__ in {"__main__", "__mp_main__"}:
         ui.button('Reset Map', on_click=lambda: reset_map())
 
     with ui.grid(columns=2).classes('w-full justify-center'):
-        add_station_inputs = {'Name': [], 'Neighbours': [], 'Lines': []}
+        # Neighbours and Lines map each selection to None, so they keep the order the user picked them in.
+        add_station_inputs = {'Name': None, 'Neighbours': {}, 'Lines': {}}
         with ui.row().style('background-color: #90EE90'):
+            def update_add_station_name(value: str) -> None:
+                add_station_inputs['Name'] = value
+
             def update_selected_add_station(key: str, value: str) -> None:
-                add_station_inputs[key].append(value)
+                add_station_inputs[key][value] = None
                 selected_neighbours_label.refresh()
                 selected_lines_label.refresh()
 
             def refresh_add_station() -> None:
-                for value in add_station_inputs.values():
-                    del value[:]
+                add_station_inputs['Name'] = None
+                add_station_inputs['Neighbours'].clear()
+                add_station_inputs['Lines'].clear()
 
             @ui.refreshable
             def select_neighbours() -> None:
-                stations = sorted([v.item for v in subway_graph.get_all_vertices(set())])
-                stations.append('No Stations')
-                ui.select(stations, label='Neighbours',
+                ui.select(subway_graph.sorted_vertex_items() + ['No Stations'], label='Neighbours',
                           on_change=lambda e: update_selected_add_station('Neighbours', e.value))
 
             @ui.refreshable
             def select_lines() -> None:
-                lines = sorted(subway_graph.get_all_lines())
-                lines.append('No Lines')
-                ui.select(lines, label='Lines',
+                ui.select(subway_graph.sorted_line_names() + ['No Lines'], label='Lines',
                           on_change=lambda e: update_selected_add_station('Lines', e.value))
             ui.label('Add Station')
             ui.input(label='Name of station to be added',
-                     on_change=lambda e: add_station_inputs['Name'].append(e.value))
+                     on_change=lambda e: update_add_station_name(e.value))
             select_neighbours()
             select_lines()
             ui.button('Click to add station', on_click=lambda: add_station(subway_graph, add_station_inputs)
                       ).props('color=positive')
 
-        remove_station_input = []
+        remove_station_input = {'Station': None}
         with ui.row().style('background-color: #FF7F7F'):
             def update_selected_remove_station(value: str) -> None:
-                remove_station_input.append(value)
+                remove_station_input['Station'] = value
                 selected_station_label.refresh()
 
             def refresh_remove_station() -> None:
-                remove_station_input.clear()
+                remove_station_input['Station'] = None
 
             @ui.refreshable
             def select_remove() -> None:
-                ui.select(sorted([v.item for v in subway_graph.get_all_vertices(set())]),
+                ui.select(list(subway_graph.sorted_vertex_items()),
                           label='Select a station to remove',
                           on_change=lambda e: update_selected_remove_station(e.value))
             ui.label('Remove Station')
             select_remove()
             ui.button('Click to remove station',
-                      on_click=lambda: remove_station(subway_graph, remove_station_input[len(remove_station_input) - 1])
+                      on_click=lambda: remove_station(subway_graph, remove_station_input['Station'])
                       ).props('color=negative')
 
         with ui.row():
@@ -217,52 +235,54 @@ if __name__ in {"__main__", "__mp_main__"}:
             @ui.refreshable
             def selected_station_label() -> None:
                 station = ''
-                if len(remove_station_input) > 0:
-                    station = remove_station_input[len(remove_station_input) - 1]
+                if remove_station_input['Station'] is not None:
+                    station = remove_station_input['Station']
                 ui.label(f'Selected Station to Remove: {station}')
 
             selected_station_label()
 
-        add_line_inputs = {'Name': [], 'Stations': []}
+        add_line_inputs = {'Name': None, 'Stations': []}
         with ui.row().style('background-color: #90EE90'):
             def update_selected_add_line(value: str) -> None:
                 add_line_inputs['Stations'].append(value)
                 selected_stations_label.refresh()
 
+            def update_add_line_name(value: str) -> None:
+                add_line_inputs['Name'] = value
+
             def refresh_add_line() -> None:
-                for value in add_line_inputs.values():
-                    del value[:]
+                add_line_inputs['Name'] = None
+                add_line_inputs['Stations'].clear()
 
             @ui.refreshable
             def select_stations() -> None:
-                stations = sorted([v.item for v in subway_graph.get_all_vertices(set())])
-                ui.select(stations, label='Stations. Select multiple to add multiple stations.',
+                ui.select(list(subway_graph.sorted_vertex_items()),
+                          label='Stations. Select multiple to add multiple stations.',
                           on_change=lambda e: update_selected_add_line(e.value))
             ui.label('Add Line')
             ui.input(label='Name of line to be added',
-                     on_change=lambda e: add_line_inputs['Name'].append(e.value))
+                     on_change=lambda e: update_add_line_name(e.value))
             select_stations()
             ui.button('Click to add line', on_click=lambda: add_line(subway_graph, add_line_inputs)
                       ).props('color=positive')
 
-        remove_line_input = []
+        remove_line_input = {'Line': None}
         with ui.row().style('background-color: #FF7F7F'):
             def update_selected_remove_line(value: str) -> None:
-                remove_line_input.append(value)
+                remove_line_input['Line'] = value
                 selected_remove_line_label.refresh()
 
             def refresh_remove_line() -> None:
-                remove_line_input.clear()
+                remove_line_input['Line'] = None
 
             @ui.refreshable
             def select_remove_line() -> None:
-                lines = sorted(subway_graph.get_all_lines())
-                ui.select(lines, label='Select a line to remove',
+                ui.select(subway_graph.sorted_line_names(), label='Select a line to remove',
                           on_change=lambda e: update_selected_remove_line(e.value))
             ui.label('Remove Line')
             select_remove_line()
             ui.button('Click to remove line',
-                      on_click=lambda: remove_line(subway_graph, remove_line_input[len(remove_line_input) - 1])
+                      on_click=lambda: remove_line(subway_graph, remove_line_input['Line'])
                       ).props('color=negative')
 
         with ui.row():
@@ -277,16 +297,17 @@ if __name__ in {"__main__", "__mp_main__"}:
             @ui.refreshable
             def selected_remove_line_label() -> None:
                 line = ''
-                if len(remove_line_input) > 0:
-                    line = remove_line_input[len(remove_line_input) - 1]
+                if remove_line_input['Line'] is not None:
+                    line = remove_line_input['Line']
                 ui.label(f'Selected Line to Remove: {line}')
 
             selected_remove_line_label()
 
     (ui.label('TTC Map (circa 2017, Scarborough RT excluded)').classes('w-full text-center')
      .style('color: black; font-size: 200%; font-weight: 400'))
-    data1 = visualize_graph(subway_graph)
-    fig = Figure(data=data1)
+    # Start with empty (but fully styled) traces so the page can be served straight away;
+    # the map itself is drawn by the redraw timer on its first tick.
+    fig = Figure(data=visualize_graph(transit_map.Graph()), _validate=False)
     fig.update_layout(
         {'showlegend': False},
         margin=dict(l=20, r=20, t=20, b=20),
@@ -294,6 +315,8 @@ if __name__ in {"__main__", "__mp_main__"}:
     fig.update_xaxes(showgrid=False, zeroline=False, visible=False)
     fig.update_yaxes(showgrid=False, zeroline=False, visible=False)
     plot = ui.plotly(fig).classes('w-full h-full')
+    ui.timer(0.2, redraw_graph)
+    update_graph(subway_graph)
 
     ui.run(reload='FLY_ALLOC_ID' not in os.environ, host='0.0.0.0', port=8080, title='The TTC Improvement Game')
 
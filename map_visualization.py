@@ -1,9 +1,10 @@
 """
-Converts a NetworkX graph into a list of plotly Scatters.
+Converts a transit graph into a list of plotly Scattergl traces.
 Used for visualizing subway data.
 """
 
-from plotly.graph_objs import Scatter
+import numpy as np
+from plotly.graph_objs import Scattergl
 
 import transit_map
 
@@ -16,57 +17,114 @@ BIKE_SHARE_COLOUR = 'rgb(254, 116, 77)'  # orange
 SURFACE_COLOUR = 'rgb(255, 0, 0)'  # red
 GENERAL_COLOUR = 'rgb(0, 0, 0)'  # black
 
+# A station is coloured by the first of these lines that it is on, or GENERAL_COLOUR if it is on none of them.
+KIND_COLOUR = (('1 Yonge-University', LINE_1_COLOUR),
+               ('2 Bloor-Danforth', LINE_2_COLOUR),
+               ('4 Sheppard', LINE_4_COLOUR),
+               ('Surface', SURFACE_COLOUR),
+               ('Bike Share', BIKE_SHARE_COLOUR))
+# The colours above in priority order, followed by GENERAL_COLOUR. Indexed by a vertex's colour priority.
+PALETTE = np.array([colour for _, colour in KIND_COLOUR] + [GENERAL_COLOUR])
+
+
+def _priority_table() -> np.ndarray:
+    """Return a lookup table mapping every possible kind mask (see transit_map.KIND_BITS) to an index
+    into PALETTE: the first line in KIND_COLOUR that the mask contains, or the index of GENERAL_COLOUR.
+    """
+    table = np.full(2 * max(transit_map.KIND_BITS.values()), len(KIND_COLOUR), dtype=np.int8)
+    for mask in range(len(table)):
+        for i, (line, _) in enumerate(KIND_COLOUR):
+            if mask & transit_map.KIND_BITS[line]:
+                table[mask] = i
+                break
+    return table
+
+
+PRIORITY_TABLE = _priority_table()
+
+# The arrays most recently returned by trace_arrays, along with the graph, graph version, and
+# max_vertices they were computed for. Redrawing an unchanged graph reuses these arrays.
+_trace_cache = {'graph': None, 'version': None, 'max_vertices': None, 'arrays': None}
+
+
+def trace_arrays(graph: transit_map.Graph,
+                 max_vertices: int = 5000) -> tuple[list, list, list, list, list[str], list[str]]:
+    """Return the data that visualize_graph plots for the given graph, as a tuple
+    (x_edges, y_edges, x_values, y_values, colours, labels).
+
+    This lets an existing figure be updated in place instead of rebuilding its traces.
+    The vertices and edges are read directly from the graph's parallel arrays and CSR adjacency,
+    without building a networkx Graph. Each vertex is drawn at its stored position, so no layout
+    algorithm is run. The result is cached until the graph is next changed.
+
+    Optional arguments:
+        - max_vertices: the maximum number of vertices that can appear in the graph
+    """
+    if (_trace_cache['graph'] is graph and _trace_cache['version'] == graph.version
+            and _trace_cache['max_vertices'] == max_vertices):
+        return _trace_cache['arrays']
+
+    items, lines, kind_mask, usage, positions = graph.to_arrays(max_vertices)
+    x_values = positions[:, 0]
+    y_values = positions[:, 1]
+
+    labels = [f'{k}, {" and ".join(map(str, kind)) if kind else "No Lines"}, {riders} riders per day'
+              for k, kind, riders in zip(items, lines, usage)]
+
+    colours = PALETTE[PRIORITY_TABLE[kind_mask]].tolist()
+
+    # Each edge is drawn as a line segment between its endpoints, followed by a NaN to break the line.
+    # Keep one direction of each edge, and only edges between vertices that are being drawn.
+    offsets, neighbours = graph.adjacency_csr()
+    sources = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+    keep = (sources <= neighbours) & (neighbours < len(items))
+    edges = np.column_stack((sources[keep], neighbours[keep]))
+    x_edges = np.empty(3 * len(edges))
+    y_edges = np.empty(3 * len(edges))
+    x_edges[0::3] = x_values[edges[:, 0]]
+    x_edges[1::3] = x_values[edges[:, 1]]
+    x_edges[2::3] = np.nan
+    y_edges[0::3] = y_values[edges[:, 0]]
+    y_edges[1::3] = y_values[edges[:, 1]]
+    y_edges[2::3] = np.nan
+
+    # Recent versions of plotly.py encode NumPy arrays as base64 typed arrays, which the plotly.js
+    # bundled with NiceGUI cannot read, so the coordinates are handed over as plain lists.
+    arrays = (x_edges.tolist(), y_edges.tolist(), x_values.tolist(), y_values.tolist(), colours, labels)
+    _trace_cache.update(graph=graph, version=graph.version, max_vertices=max_vertices, arrays=arrays)
+    return arrays
+
 
 def visualize_graph(graph: transit_map.Graph,
-                    max_vertices: int = 5000) -> list[Scatter]:
-    """Use plotly and networkx to visualize the given graph.
+                    max_vertices: int = 5000) -> list[Scattergl]:
+    """Use plotly to visualize the given graph. See trace_arrays for how the plotted data is computed.
 
     Optional arguments:
-        - layout: which graph layout algorithm to use
         - max_vertices: the maximum number of vertices that can appear in the graph
     """
-    graph_nx = graph.to_networkx(max_vertices)
-
-    x_values = [graph_nx.nodes[k]['position'][0] for k in graph_nx.nodes]
-    y_values = [graph_nx.nodes[k]['position'][1] for k in graph_nx.nodes]
-
-    labels = [(f'{k}, '
-               f'{" and ".join(str(n) for n in list(graph_nx.nodes[k]["kind"])) if len(list(graph_nx.nodes[k]["kind"])) > 0 else "No Lines"}, '
-               f'{graph_nx.nodes[k]["usage"]} riders per day') for k in graph_nx.nodes]
-
-    kinds = [graph_nx.nodes[k]['kind'] for k in graph_nx.nodes]
-    colours = [LINE_1_COLOUR if '1 Yonge-University' in kind
-               else LINE_2_COLOUR if '2 Bloor-Danforth' in kind
-               else LINE_4_COLOUR if '4 Sheppard' in kind
-               else SURFACE_COLOUR if 'Surface' in kind
-               else BIKE_SHARE_COLOUR if 'Bike Share' in kind
-               else GENERAL_COLOUR for kind in kinds]
-
-    x_edges = []
-    y_edges = []
-    for edge in graph_nx.edges:
-        x_edges += [graph_nx.nodes[edge[0]]['position'][0], graph_nx.nodes[edge[1]]['position'][0], None]
-        y_edges += [graph_nx.nodes[edge[0]]['position'][1], graph_nx.nodes[edge[1]]['position'][1], None]
-
-    trace3 = Scatter(x=x_edges,
-                     y=y_edges,
-                     mode='lines',
-                     name='edges',
-                     line=dict(color=GENERAL_COLOUR, width=3),
-                     hoverinfo='none',
-                     )
-    trace4 = Scatter(x=x_values,
-                     y=y_values,
-                     mode='markers',
-                     name='nodes',
-                     marker=dict(symbol='circle-dot',
-                                 size=5,
-                                 color=colours,
-                                 line=dict(color=colours, width=2)
-                                 ),
-                     text=labels,
-                     hovertemplate='%{text}',
-                     hoverlabel={'namelength': 0}
-                     )
+    x_edges, y_edges, x_values, y_values, colours, labels = trace_arrays(graph, max_vertices)
+
+    trace3 = Scattergl(x=x_edges,
+                       y=y_edges,
+                       mode='lines',
+                       name='edges',
+                       line=dict(color=GENERAL_COLOUR, width=3),
+                       hoverinfo='none',
+                       _validate=False
+                       )
+    trace4 = Scattergl(x=x_values,
+                       y=y_values,
+                       mode='markers',
+                       name='nodes',
+                       marker=dict(symbol='circle-dot',
+                                   size=5,
+                                   color=colours,
+                                   line=dict(color=colours, width=2)
+                                   ),
+                       text=labels,
+                       hovertemplate='%{text}',
+                       hoverlabel={'namelength': 0},
+                       _validate=False
+                       )
 
     return [trace3, trace4]
@@ -3,10 +3,23 @@ Models TTC and Bike Share Toronto ridership data using a graph that incorporates
 subway stops, aboveground transit (streetcar and bus) stops, and bike docking stations.
 """
 from __future__ import annotations
+import bisect
+from collections import deque
 import csv
+from itertools import combinations, islice
+import sys
 from typing import Any, Optional
-import statistics
 import networkx as nx
+import numpy as np
+
+# Bit flags for the lines that decide how a vertex is drawn, in order of priority (lowest bit first).
+# Graph.to_arrays combines the flags of every line a vertex is on into a single kind mask.
+# Graph._add_lines interns every line name as it enters the graph, so looking them up here compares by identity.
+KIND_BITS = {sys.intern('1 Yonge-University'): 1,
+             sys.intern('2 Bloor-Danforth'): 2,
+             sys.intern('4 Sheppard'): 4,
+             sys.intern('Surface'): 8,
+             sys.intern('Bike Share'): 16}
 
 
 class _Vertex:
@@ -14,99 +27,180 @@ class _Vertex:
     A vertex in a transit graph. Each vertex represents a stop, aboveground transit line, or bike docking station,
     and an edge between vertices represents a connection between two stops.
     """
+    __slots__ = ('item', 'lines', 'neighbours', '_graph', '_idx')
+
     item: Any
     lines: set[str]
-    usage: int
     neighbours: set[_Vertex]
-    position: tuple[int, int]
 
-    def __init__(self, item: Any, lines: set[str], usage: int, position: tuple[int, int] = (0, 0)) -> None:
-        """Initialize a new vertex with the given item, line, and usage.
+    # Private Instance Attributes:
+    #     - _graph:
+    #         The graph this vertex belongs to. The graph stores the usage and position of its vertices
+    #         in float64 arrays, so both are read back as floats.
+    #     - _idx:
+    #         A small integer that identifies this vertex within its graph, assigned by Graph.add_vertex.
+    #         Traversals use it to index flat visited arrays instead of hashing vertices into sets,
+    #         and it is this vertex's row in the graph's usage and position arrays.
+    _graph: Graph
+    _idx: int
+
+    def __init__(self, graph: Graph, idx: int, item: Any, lines: set[str], usage: float,
+                 position: tuple[float, float] = (0, 0)) -> None:
+        """Initialize a new vertex of the given graph with the given index, item, line, and usage.
 
         This vertex is initialized with no neighbours
         """
+        self._graph = graph
+        self._idx = idx
         self.item = item
         self.lines = lines
         self.usage = usage
         self.neighbours = set()
         self.position = position
 
-    def degree(self) -> int:
-        """Return the degree of this vertex."""
-        return len(self.neighbours)
-
-    def check_connected(self, target_item: Any, visited: set[_Vertex]) -> bool:
-        """Return whether this vertex is connected to a vertex corresponding to the target_item,
-        WITHOUT using any of the vertices in visited.
-
-        Preconditions:
-            - self not in visited
-        """
-        if self.item == target_item:
-            return True
-        else:
-            visited.add(self)
-            for u in self.neighbours:
-                if u not in visited:
-                    if u.check_connected(target_item, visited):
-                        return True
-
-            return False
-
-    def check_connected_path(self, target_item: Any, visited: set[_Vertex]) -> Optional[list]:
-        """Return a path between self and the vertex corresponding to the target_item,
-        WITHOUT using any of the vertices in visited.
+    @property
+    def usage(self) -> float:
+        """The daily usage of this vertex, as a float."""
+        return float(self._graph._usage[self._idx])
 
-        The returned list contains the ITEMS stored in the _Vertex objects, not the _Vertex
-        objects themselves. The first list element is self.item, and the last is target_item.
-        If there is more than one such path, any of the paths is returned.
+    @usage.setter
+    def usage(self, value: float) -> None:
+        self._graph._usage[self._idx] = value
 
-        Return None if no such path exists (i.e., if self is not connected to a vertex with
-        the target_item). Note that this is very similar to _Vertex.check_connected, except
-        this method returns an Optional[list] instead of a bool.
+    @property
+    def position(self) -> tuple[float, float]:
+        """The (x, y) position of this vertex on the map, as a pair of floats."""
+        x, y = self._graph._pos[self._idx].tolist()
+        return x, y
 
-        Go to Graph.connected_path() for doctests.
-
-        Preconditions:
-            - self not in visited
-        """
-        if self.item == target_item:
-            return [self.item]
+    @position.setter
+    def position(self, value: tuple[float, float]) -> None:
+        self._graph._pos[self._idx] = value
 
-        path = [self.item]
-        visited.add(self)
-
-        for u in self.neighbours:
-            if u not in visited:
-                neighbours_path = u.check_connected_path(target_item, visited)
-                if neighbours_path:
-                    return path + neighbours_path
-
-        return None
+    def degree(self) -> int:
+        """Return the degree of this vertex."""
+        return len(self.neighbours)
 
 
 class Graph:
     """
     A transit graph. Represented by a dictionary of subway stations, aboveground lines, and bike docking stations.
+
+    Instance Attributes:
+        - version: a counter that increases every time this graph is changed
     """
+    version: int
+
     # Private Instance Attributes:
     #     - _vertices:
     #         A collection of the vertices contained in this graph.
     #         Maps item to _Vertex object.
+    #     - _sorted_items:
+    #         The items of every vertex in this graph, kept in sorted order as vertices are added and removed.
+    #     - _vertex_item_cache:
+    #         The items of every vertex in this graph, or None if it needs to be rebuilt.
+    #     - _line_cache:
+    #         Every line in this graph, or None if it needs to be rebuilt.
+    #     - _sorted_lines:
+    #         Every line in this graph in sorted order, or None if it needs to be rebuilt.
+    #     - _csr_cache:
+    #         The (offsets, neighbours) arrays returned by adjacency_csr, or None if they need to be rebuilt.
+    #     - _next_idx:
+    #         The _idx given to the next vertex added to this graph. Indices are never reused, so every
+    #         vertex in this graph has a distinct _idx less than this value.
+    #     - _usage:
+    #         The usage of every vertex in this graph, indexed by _idx. Grows as vertices are added;
+    #         the entries of removed vertices, and those at or past _next_idx, are unused.
+    #     - _pos:
+    #         The (x, y) position of every vertex in this graph, as an array of shape (n, 2) laid out like _usage.
+    #     - _idx_cache:
+    #         The _idx of every vertex in this graph, in the order of _vertices, or None if it needs to be rebuilt.
+    #     - _lines_index:
+    #         Maps each line in this graph to the set of vertices on that line.
+    #         Kept up to date as vertices and lines are added and removed, and has no empty entries.
     _vertices: dict[Any, _Vertex]
+    _sorted_items: list
+    _vertex_item_cache: Optional[frozenset]
+    _line_cache: Optional[frozenset[str]]
+    _sorted_lines: Optional[list[str]]
+    _csr_cache: Optional[tuple[np.ndarray, np.ndarray]]
+    _next_idx: int
+    _usage: np.ndarray
+    _pos: np.ndarray
+    _idx_cache: Optional[np.ndarray]
+    _lines_index: dict[str, set[_Vertex]]
 
     def __init__(self) -> None:
         """Initialize an empty graph (no vertices or edges)."""
+        self.version = 0
         self._vertices = {}
+        self._sorted_items = []
+        self._vertex_item_cache = None
+        self._line_cache = None
+        self._sorted_lines = None
+        self._csr_cache = None
+        self._next_idx = 0
+        self._usage = np.zeros(0)
+        self._pos = np.zeros((0, 2))
+        self._idx_cache = None
+        self._lines_index = {}
+
+    def _record_change(self) -> None:
+        """Bump the version of this graph and clear its cached vertex items, lines, and adjacency arrays.
+        Called by every method that changes the vertices, edges, lines, or usage of this graph.
+        """
+        self.version += 1
+        self._vertex_item_cache = None
+        self._line_cache = None
+        self._sorted_lines = None
+        self._csr_cache = None
+        self._idx_cache = None
 
-    def add_vertex(self, item: Any, lines: set[str], usage: int, position: tuple[int, int]) -> None:
+    def _vertex_indices(self) -> np.ndarray:
+        """Return the _idx of every vertex in this graph, in the same order as _vertices.
+
+        The array is cached until this graph is next changed, so it must not be modified.
+        """
+        if self._idx_cache is None:
+            self._idx_cache = np.fromiter((v._idx for v in self._vertices.values()), dtype=np.intp,
+                                          count=len(self._vertices))
+        return self._idx_cache
+
+    def _add_lines(self, vertex: _Vertex, lines: set[str]) -> None:
+        """Put the given vertex on each of the given lines, keeping _lines_index up to date.
+        Line names are interned here, since this is the only place lines enter a vertex.
+        """
+        for line in list(lines):
+            line = sys.intern(line)
+            vertex.lines.add(line)
+            self._lines_index.setdefault(line, set()).add(vertex)
+
+    def _remove_from_lines_index(self, vertex: _Vertex) -> None:
+        """Remove the given vertex from the _lines_index entry of every line it is on."""
+        for line in vertex.lines:
+            on_line = self._lines_index[line]
+            on_line.discard(vertex)
+            if not on_line:
+                del self._lines_index[line]
+
+    def add_vertex(self, item: Any, lines: set[str], usage: float, position: tuple[float, float]) -> None:
         """Add a vertex with the given item and kind to this graph.
 
         The new vertex is not adjacent to any other vertices.
         Do nothing if the given item is already in this graph.
         """
         if item not in self._vertices:
-            self._vertices[item] = _Vertex(item, lines, usage, position)
+            if self._next_idx == len(self._usage):
+                # Double the arrays so that adding n vertices only copies them O(log n) times.
+                extra = max(len(self._usage), 16)
+                self._usage = np.concatenate((self._usage, np.zeros(extra)))
+                self._pos = np.concatenate((self._pos, np.zeros((extra, 2))))
+            v = _Vertex(self, self._next_idx, item, set(), usage, position)
+            self._next_idx += 1
+            self._add_lines(v, lines)
+            self._vertices[item] = v
+            bisect.insort(self._sorted_items, item)
+            self._record_change()
 
     def add_edge(self, item1: Any, item2: Any) -> None:
         """Add an edge between the two vertices with the given items in this graph.
@@ -121,6 +215,7 @@ class Graph:
             v2 = self._vertices[item2]
             v1.neighbours.add(v2)
             v2.neighbours.add(v1)
+            self._record_change()
         elif item1 not in self._vertices:
             raise ValueError(f"no station called {item1}")
         else:
@@ -132,8 +227,7 @@ class Graph:
         Return False if item1 or item2 do not appear as vertices in this graph.
         """
         if item1 in self._vertices and item2 in self._vertices:
-            v1 = self._vertices[item1]
-            return any(v2.item == item2 for v2 in v1.neighbours)
+            return self._vertices[item2] in self._vertices[item1].neighbours
         else:
             return False
 
@@ -150,32 +244,161 @@ class Graph:
         else:
             raise ValueError
 
-    def get_all_vertices(self, lines: set[str]) -> set:
+    def get_all_vertices(self, lines: Optional[set[str]] = None) -> set:
         """Return a set of all vertices in this graph.
 
-        If lines != set(), only return the vertices of the given line(s).
+        If lines is given and not empty, only return the vertices of the given line(s).
+        Use vertex_items() instead when only the items of the vertices are needed.
         """
-        if lines != set():
-            return {v for v in self._vertices.values() if any(line in v.lines for line in lines)}
+        if lines:
+            return set().union(*(self._lines_index.get(line, ()) for line in lines))
         else:
             return set(self._vertices.values())
 
+    def vertex_items(self) -> frozenset:
+        """Return a frozenset of the items of every vertex in this graph.
+
+        The result is cached until a vertex is added or removed, so membership checks are cheap.
+        >>> my_graph = load_subway_map('subway.csv', 'subway_lines.csv')
+        >>> 'DONLANDS' in my_graph.vertex_items()
+        True
+        """
+        if self._vertex_item_cache is None:
+            self._vertex_item_cache = frozenset(self._vertices)
+        return self._vertex_item_cache
+
+    def line_names(self) -> frozenset[str]:
+        """Return a frozenset of all lines in this graph.
+
+        The result is cached until the lines of this graph change.
+        >>> my_graph = load_subway_map('subway.csv', 'subway_lines.csv')
+        >>> '4 Sheppard' in my_graph.line_names()
+        True
+        """
+        if self._line_cache is None:
+            self._line_cache = frozenset(self.get_all_lines())
+        return self._line_cache
+
+    def sorted_vertex_items(self) -> list:
+        """Return the items of every vertex in this graph in sorted order. This is used for drop-down menus.
+
+        The returned list is kept up to date by this graph, so it must not be modified.
+        >>> my_graph = load_subway_map('subway.csv', 'subway_lines.csv')
+        >>> my_graph.sorted_vertex_items()[:3]
+        ['BATHURST', 'BAY', 'BAYVIEW']
+        """
+        return self._sorted_items
+
+    def sorted_line_names(self) -> list[str]:
+        """Return every line in this graph in sorted order. This is used for drop-down menus.
+
+        The result is cached until the lines of this graph change, so it must not be modified.
+        >>> my_graph = load_subway_map('subway.csv', 'subway_lines.csv')
+        >>> my_graph.sorted_line_names()
+        ['1 Yonge-University', '2 Bloor-Danforth', '4 Sheppard']
+        """
+        if self._sorted_lines is None:
+            self._sorted_lines = sorted(self.line_names())
+        return self._sorted_lines
+
     def connected_path(self, item1: Any, item2: Any) -> Optional[list]:
-        """Return a path between item1 and item2 in this graph.
+        """Return a shortest path between item1 and item2 in this graph.
 
-        The returned list contains the ITEMS along the path.
+        The returned list contains the ITEMS along the path, starting with item1 and ending with item2.
+        If there is more than one shortest path, any of them is returned.
         Return None if no such path exists, including when item1 or item2
         do not appear as vertices in this graph.
+
+        The path is found with a breadth-first search, which records the vertex each vertex was
+        reached from (indexed by _idx) and walks those links back from item2 once it is found.
         >>> my_graph = load_subway_map('subway.csv', 'subway_lines.csv')
         >>> my_graph.connected_path('CHRISTIE', 'ST. CLAIR WEST')
         ['CHRISTIE', 'BATHURST', 'SPADINA', 'DUPONT', 'ST. CLAIR WEST']
+        >>> my_graph.connected_path('KIPLING', 'KIPLING')
+        ['KIPLING']
         """
         if item1 in self._vertices and item2 in self._vertices:
             v1 = self._vertices[item1]
-            return v1.check_connected_path(item2, set())
+            visited = bytearray(self._next_idx)
+            parents = [None] * self._next_idx
+            visited[v1._idx] = 1
+            queue = deque([v1])
+            while queue:
+                v = queue.popleft()
+                if v.item == item2:
+                    path = []
+                    while v is not None:
+                        path.append(v.item)
+                        v = parents[v._idx]
+                    path.reverse()
+                    return path
+                for u in v.neighbours:
+                    if not visited[u._idx]:
+                        visited[u._idx] = 1
+                        parents[u._idx] = v
+                        queue.append(u)
+            return None
         else:
             return None
 
+    def to_arrays(self, max_vertices: int = 5000) -> tuple[list, list[set[str]], np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Return the vertices of this graph as parallel arrays, which is faster to visualize than a networkx Graph.
+
+        The returned tuple contains, in the same vertex order:
+            - the items of the vertices
+            - the lines of each vertex
+            - a uint8 array of kind masks, combining the KIND_BITS of each vertex's lines
+            - an int32 array of the (rounded) usage of each vertex
+            - a float64 array of shape (n, 2) holding the position of each vertex
+
+        max_vertices specifies the maximum number of vertices that are returned.
+        >>> my_graph = load_subway_map('subway.csv', 'subway_lines.csv')
+        >>> items, lines, kind_mask, usage, positions = my_graph.to_arrays()
+        >>> i = items.index('BLOOR-YONGE')
+        >>> int(kind_mask[i]) == KIND_BITS['1 Yonge-University'] | KIND_BITS['2 Bloor-Danforth']
+        True
+        >>> positions[i].tolist()
+        [-3.0, 0.0]
+        """
+        items, lines, kind_masks = [], [], []
+        kind_bit = KIND_BITS.get
+        for v in islice(self._vertices.values(), max_vertices):
+            items.append(v.item)
+            lines.append(v.lines)
+            kind_masks.append(sum(kind_bit(line, 0) for line in v.lines))
+        idx = self._vertex_indices()[:max_vertices]
+        return (items, lines, np.array(kind_masks, dtype=np.uint8), np.rint(self._usage[idx]).astype(np.int32),
+                self._pos[idx])
+
+    def adjacency_csr(self) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Return the edges of this graph in compressed sparse row (CSR) form, as a tuple (offsets, neighbours).
+
+        Vertices are numbered in the same order as in to_arrays. The indices of the neighbours of vertex i
+        are neighbours[offsets[i]:offsets[i + 1]], so every edge appears twice, once from each endpoint.
+        The arrays are cached until this graph is next changed.
+        >>> my_graph = load_subway_map('subway.csv', 'subway_lines.csv')
+        >>> offsets, neighbours = my_graph.adjacency_csr()
+        >>> items = my_graph.to_arrays()[0]
+        >>> i = items.index('KIPLING')
+        >>> [items[j] for j in neighbours[offsets[i]:offsets[i + 1]]]
+        ['ISLINGTON']
+        """
+        if self._csr_cache is None:
+            vertices = self._vertices.values()
+            idx = self._vertex_indices()
+            # Maps the _idx of each vertex to its number in the order of _vertices.
+            number = np.empty(self._next_idx, dtype=np.int32)
+            number[idx] = np.arange(len(idx), dtype=np.int32)
+            offsets = np.zeros(len(idx) + 1, dtype=np.int32)
+            np.cumsum(np.fromiter((len(v.neighbours) for v in vertices), dtype=np.int32, count=len(idx)),
+                      out=offsets[1:])
+            neighbours = number[np.fromiter((u._idx for v in vertices for u in v.neighbours),
+                                            dtype=np.intp, count=offsets[-1])]
+            self._csr_cache = (offsets, neighbours)
+        return self._csr_cache
+
     def to_networkx(self, max_vertices: int = 5000) -> nx.Graph:
         """
         Convert this graph into a networkx Graph.
@@ -186,19 +409,21 @@ class Graph:
         Note: This implementation passes the lines and usage parameters into NetworkX,
         which allows the user to see those parameters when they hover over a node in the graph
         """
-        graph_nx = nx.Graph()
-        for v in self._vertices.values():
-            graph_nx.add_node(v.item, kind=v.lines, usage=round(v.usage), position=v.position)
+        vertices = list(islice(self._vertices.values(), max_vertices))
+        idx = self._vertex_indices()[:max_vertices]
+        usages = np.rint(self._usage[idx]).astype(int).tolist()
+        positions = self._pos[idx].tolist()
 
-            for u in v.neighbours:
-                if graph_nx.number_of_nodes() < max_vertices:
-                    graph_nx.add_node(v.item, kind=v.lines, usage=round(v.usage), position=v.position)
-
-                if u.item in graph_nx.nodes:
-                    graph_nx.add_edge(v.item, u.item)
+        graph_nx = nx.Graph()
+        graph_nx.add_nodes_from((v.item, {'kind': v.lines, 'usage': usage, 'position': tuple(position)})
+                                for v, usage, position in zip(vertices, usages, positions))
 
-            if graph_nx.number_of_nodes() >= max_vertices:
-                break
+        # _idx increases in the order of _vertices, so the included vertices are exactly those with an _idx
+        # up to the last one's. Each edge is emitted once, from its endpoint with the smaller _idx,
+        # and self-loops are kept, as in map_visualization.trace_arrays.
+        last_idx = int(idx[-1]) if len(idx) > 0 else -1
+        graph_nx.add_edges_from((v.item, u.item) for v in vertices for u in v.neighbours
+                                if v._idx <= u._idx <= last_idx)
 
         return graph_nx
 
@@ -207,14 +432,22 @@ class Graph:
         Calculate the spread of ridership of this graph by finding the standard deviation
         of the daily usage of every vertex in the graph.
         If lines != set(), spread will be calculated for the lines given only.
+        If there are no such vertices, the spread is 0.0.
         >>> my_graph = load_subway_map('subway.csv', 'subway_lines.csv')
         >>> my_graph.spread_of_ridership(set())
         58583.62942764618
+        >>> round(my_graph.spread_of_ridership({'4 Sheppard'}))
+        46367
+        >>> my_graph.spread_of_ridership({'no such line'})
+        0.0
         """
-        if lines != set():
-            return statistics.pstdev([self._vertices[v].usage for v in self._vertices if v.line in lines])
+        if lines:
+            idx = [v._idx for v in self.get_all_vertices(lines)]
         else:
-            return statistics.pstdev([self._vertices[v].usage for v in self._vertices])
+            idx = self._vertex_indices()
+        if len(idx) == 0:
+            return 0.0
+        return float(self._usage[idx].std())
 
     def add_station(self, name: str, neighbours: set[str], lines: set[str]) -> None:
         """
@@ -229,7 +462,7 @@ class Graph:
         >>> my_graph = load_subway_map('subway.csv', 'subway_lines.csv')
         >>> my_graph = load_extras(my_graph, 'bikeshare_cleaned.csv', 'surface.csv')
         >>> my_graph.add_station('New Bike Share Station', set(), {'Bike Share'})
-        >>> stations = [v.item for v in my_graph.get_all_vertices(set())]
+        >>> stations = [v.item for v in my_graph.get_all_vertices()]
         >>> 'New Bike Share Station' in stations
         True
         >>> my_graph.get_neighbours('New Bike Share Station')
@@ -248,24 +481,18 @@ class Graph:
         elif len(neighbours) == 1:
             for nb in neighbours:
                 nb_vert = self._vertices[nb]
-                nb_x = nb_vert.position[0]
-                nb_y = nb_vert.position[1]
+                nb_x, nb_y = nb_vert.position
                 if len(nb_vert.neighbours) == 0:
                     position = (nb_x + 1, nb_y)
                 else:
-                    x_diffs = []
-                    y_diffs = []
+                    diffs = []
                     for nb2_vert in nb_vert.neighbours:
-                        nb2_x = nb2_vert.position[0]
-                        nb2_y = nb2_vert.position[1]
-                        x_diffs.append(nb_x - nb2_x)
-                        y_diffs.append(nb_y - nb2_y)
-                    if len(nb_vert.neighbours) == 1:
-                        position = (nb_x + x_diffs[0], nb_y + y_diffs[0])
+                        nb2_x, nb2_y = nb2_vert.position
+                        diffs.append((nb_x - nb2_x, nb_y - nb2_y))
+                    if len(diffs) == 1:
+                        x_diff, y_diff = diffs[0]
+                        position = (nb_x + x_diff, nb_y + y_diff)
                     else:
-                        diffs = []
-                        for i in range(len(x_diffs)):
-                            diffs.append((x_diffs[i], y_diffs[i]))
                         if all(diff != (1, 0) for diff in diffs):
                             position = (nb_x + 1, nb_y)
                         elif all(diff != (-1, 0) for diff in diffs):
@@ -279,18 +506,19 @@ class Graph:
 
         self.add_vertex(name, lines, 0, position)
 
-        usage = 0
+        # The new station sits between its neighbours, so any direct connections between them are removed.
+        for neighbour, neighbour2 in combinations(neighbours, 2):
+            neighbour_vertex = self._vertices[neighbour]
+            neighbour2_vertex = self._vertices[neighbour2]
+            neighbour_vertex.neighbours.discard(neighbour2_vertex)
+            neighbour2_vertex.neighbours.discard(neighbour_vertex)
+
         for neighbour in neighbours:
-            for neighbour2 in neighbours:
-                if self.adjacent(neighbour, neighbour2):
-                    neighbour_vertex = self._vertices[neighbour]
-                    neighbour2_vertex = self._vertices[neighbour2]
-                    neighbour_vertex.neighbours.remove(neighbour2_vertex)
-                    neighbour2_vertex.neighbours.remove(neighbour_vertex)
-            self.add_edge(name, self._vertices[neighbour].item)
-            usage += round(self._vertices[neighbour].usage / 3)
-            self._vertices[neighbour].usage *= (2 / 3)
-        self._vertices[name].usage = usage
+            self.add_edge(name, neighbour)
+        neighbour_idx = [self._vertices[neighbour]._idx for neighbour in neighbours]
+        self._vertices[name].usage = np.rint(self._usage[neighbour_idx] / 3).sum()
+        self._usage[neighbour_idx] *= (2 / 3)
+        self._record_change()
 
     def remove_station(self, name: str) -> None:
         """
@@ -304,28 +532,35 @@ class Graph:
         >>> my_graph = load_subway_map('subway.csv', 'subway_lines.csv')
         >>> my_graph.add_station('ST. GEORGE 2.0', {'ST. GEORGE', 'SPADINA', 'MUSEUM'},
         ... {'1 Yonge-University', '2 Bloor-Danforth'})
-        >>> stations = [v.item for v in my_graph.get_all_vertices(set())]
+        >>> stations = [v.item for v in my_graph.get_all_vertices()]
         >>> 'ST. GEORGE 2.0' in stations
         True
         >>> my_graph.remove_station('ST. GEORGE 2.0')
-        >>> stations = [v.item for v in my_graph.get_all_vertices(set())]
+        >>> stations = [v.item for v in my_graph.get_all_vertices()]
         >>> 'ST. GEORGE 2.0' in stations
         False
         >>> 'SPADINA' in my_graph.get_neighbours('MUSEUM')
         True
+        >>> any(my_graph.adjacent(station, station) for station in ['ST. GEORGE', 'SPADINA', 'MUSEUM'])
+        False
         """
-        for neighbour in self.get_neighbours(name):
-            self._vertices[neighbour].usage += (self._vertices[name].usage / self._vertices[name].degree())
-            for neighbour2 in self.get_neighbours(name):
-                if neighbour2 not in self.get_neighbours(neighbour):
-                    self.add_edge(neighbour, neighbour2)
-                    for line in self._vertices[neighbour].lines:
-                        self._vertices[neighbour2].lines.add(line)
-                    self._vertices[neighbour].lines = self._vertices[neighbour2].lines
-        for v in self._vertices:
-            if self._vertices[name] in self._vertices[v].neighbours:
-                self._vertices[v].neighbours.remove(self._vertices[name])
+        vertex = self._vertices[name]
+        neighbours = list(vertex.neighbours)
+        if neighbours:
+            # neighbours comes from a set, so the indices are distinct and a fancy-indexed += adds to each once.
+            self._usage[[neighbour._idx for neighbour in neighbours]] += (vertex.usage / vertex.degree())
+        for neighbour in neighbours:
+            for neighbour2 in neighbours:
+                if neighbour2 is not neighbour and neighbour2 not in neighbour.neighbours:
+                    self.add_edge(neighbour.item, neighbour2.item)
+                    self._add_lines(neighbour2, neighbour.lines)
+                    self._add_lines(neighbour, neighbour2.lines)
+        for neighbour in neighbours:
+            neighbour.neighbours.discard(vertex)
+        self._remove_from_lines_index(vertex)
         del self._vertices[name]
+        del self._sorted_items[bisect.bisect_left(self._sorted_items, name)]
+        self._record_change()
 
     def add_line(self, name: str, stations: list[str]) -> None:
         """
@@ -348,23 +583,38 @@ class Graph:
         >>> my_graph.add_line('Christie Pits', ['CHRISTIE', 'ST. CLAIR WEST'])
         >>> my_graph.adjacent('CHRISTIE', 'ST. CLAIR WEST')
         True
+        >>> my_graph.add_station('Island 1', set(), set())
+        >>> my_graph.add_station('Island 2', set(), set())
+        >>> my_graph.add_line('Ferry', ['Island 1', 'Island 2'])
+        >>> my_graph.adjacent('Island 1', 'Island 2')
+        True
+        >>> my_graph.add_line('Dup', ['KIPLING', 'KIPLING'])
+        >>> my_graph.adjacent('KIPLING', 'KIPLING')
+        False
+        >>> my_graph = load_subway_map('subway.csv', 'subway_lines.csv')
+        >>> my_graph.add_line('Loop', ['KIPLING', 'FINCH', 'KIPLING', 'FINCH'])
+        >>> loop = {v.item: round(v.usage) for v in my_graph.get_all_vertices({'Loop'})}
+        >>> loop['KIPLING'], loop['FINCH']
+        (74012, 138094)
         """
-        path_before = self.connected_path(stations[0], stations[len(stations) - 1])
+        path_before = self.connected_path(stations[0], stations[-1])
 
-        for station in stations:
-            self._vertices[station].lines.add(name)
+        vertices = [self._vertices[station] for station in stations]
 
-        for i in range(len(stations) - 2):
-            if self._vertices[stations[i + 1]] not in self._vertices[stations[i]].neighbours:
-                self.add_edge(stations[i + 1], stations[i])
-        if self._vertices[stations[len(stations) - 1]] not in self._vertices[stations[len(stations) - 1]].neighbours:
-            self.add_edge(stations[len(stations) - 2], stations[len(stations) - 1])
+        for v in vertices:
+            self._add_lines(v, {name})
 
-        if len(path_before) > len(stations):
-            for station in path_before:
-                self._vertices[station].usage *= (2 / 3)
-            for station in stations:
-                self._vertices[station].usage *= (3 / 2)
+        for v1, v2 in zip(vertices, vertices[1:]):
+            if v1 is not v2:
+                v1.neighbours.add(v2)
+                v2.neighbours.add(v1)
+
+        if path_before is not None and len(path_before) > len(stations):
+            # np.multiply.at scales a station once for each time it is listed,
+            # where a fancy-indexed *= would scale it only once.
+            np.multiply.at(self._usage, [self._vertices[station]._idx for station in path_before], 2 / 3)
+            np.multiply.at(self._usage, [v._idx for v in vertices], 3 / 2)
+        self._record_change()
 
     def remove_line(self, name: str) -> None:
         """
@@ -378,24 +628,31 @@ class Graph:
         >>> my_graph.add_station('Mississauga 3', {'Mississauga 2'}, set())
         >>> my_graph.add_line('5 Mississauga', ['KIPLING', 'Mississauga 1', 'Mississauga 2', 'Mississauga 3'])
         >>> my_graph.remove_line('5 Mississauga')
-        >>> not_sauga = [v.item for v in my_graph.get_all_vertices(set())]
+        >>> not_sauga = [v.item for v in my_graph.get_all_vertices()]
         >>> 'Mississauga 3' in not_sauga
         False
         >>> 'KIPLING' in not_sauga
         True
+        >>> my_graph.add_station('Spur 1', {'KIPLING'}, set())
+        >>> my_graph.add_station('Spur 2', {'Spur 1'}, set())
+        >>> my_graph.add_line('Spur', ['Spur 1', 'Spur 2'])
+        >>> my_graph.remove_station('Spur 1')
+        >>> 'KIPLING' in [v.item for v in my_graph.get_all_vertices({'Spur'})]
+        True
+        >>> my_graph.remove_line('Spur')
+        >>> 'Spur' in my_graph.get_all_lines()
+        False
+        >>> my_graph.get_all_vertices({'Spur'})
+        set()
+        >>> 'Spur 2' in my_graph.vertex_items()
+        True
         """
-        to_be_removed = set()
-        line_to_be_removed = set()
-        for v in self._vertices:
-            if name in self._vertices[v].lines:
-                if len(self._vertices[v].lines) == 1:
-                    to_be_removed.add(v)
-                else:
-                    line_to_be_removed.add(v)
+        to_be_removed = [v.item for v in self._lines_index.get(name, ()) if len(v.lines) == 1]
         for item in to_be_removed:
             self.remove_station(item)
-        for item in line_to_be_removed:
-            self._vertices[item].lines.remove(name)
+        for v in self._lines_index.pop(name, ()):
+            v.lines.remove(name)
+        self._record_change()
 
     def get_all_lines(self) -> list[str]:
         """
@@ -408,35 +665,18 @@ class Graph:
         >>> '5 Mississauga' in my_graph.get_all_lines()
         True
         """
-        lst = [v.lines for v in self.get_all_vertices(set())]
-        result = []
-        for station in lst:
-            for line in station:
-                if line not in result:
-                    result.append(line)
-        return result
+        return list(self._lines_index)
 
 
-def get_midpoint(points: list[tuple[int, int]]) -> tuple[int, int]:
+def get_midpoint(points: list[tuple[int, int]]) -> tuple[float, float]:
     """
     Helper function for add_station in the Graph class.
-    Returns the midpoint of two or more stations, which helps determine the position of a new station.
-    """
-    mid = midpoint(points[0][0], points[0][1], points[1][0], points[1][1])
-
-    if len(points) > 2:
-        for point in points[2:]:
-            mid = midpoint(mid[0], mid[1], point[0], point[1])
-
-    return mid
-
-
-def midpoint(x1, y1, x2, y2):
-    """
-    Helper function for get_midpoint, as defined above.
-    Calculates the midpoint of two points (x1, y1) and (x2, y2).
+    Returns the midpoint (centroid) of two or more stations, which helps determine the position of a new station.
+    >>> get_midpoint([(0, 0), (4, 0), (2, 6)])
+    (2.0, 2.0)
     """
-    return (x1 + x2) / 2, (y1 + y2) / 2
+    mid = np.mean(np.asarray(points, dtype=np.float64), axis=0)
+    return float(mid[0]), float(mid[1])
 
 
 def load_subway_map(subway_file: str, lines_file: str) -> Graph:
@@ -444,33 +684,36 @@ def load_subway_map(subway_file: str, lines_file: str) -> Graph:
     Returns a Graph of subway data only. This is useful for the
     interactive component because it only works with subway data.
     >>> my_graph = load_subway_map('subway.csv', 'subway_lines.csv')
-    >>> stations = [v.item for v in my_graph.get_all_vertices(set())]
+    >>> stations = [v.item for v in my_graph.get_all_vertices()]
     >>> 'DONLANDS' in stations
     True
-    >>> usages = [v.usage for v in my_graph.get_all_vertices(set())]
+    >>> usages = [v.usage for v in my_graph.get_all_vertices()]
     >>> 18996 in usages
     True
     """
     g = Graph()
 
     # subway
+    # A station on more than one line has a row for each line, so the rows are combined into
+    # [lines, usage, position] for each station before any vertices are added.
+    stations = {}
     with open(subway_file, 'r') as file:
-        reader = csv.reader(file)
-        for row in reader:
-            if row[1] in [a.item for a in g.get_all_vertices(set())]:
-                c = [b for b in g.get_all_vertices(set()) if b.item == row[1]][0]
-                c.lines.add(row[2])
-                c.usage += int(row[5].strip())
+        for row in csv.reader(file):
+            station = stations.get(row[1])
+            if station is None:
+                stations[row[1]] = [{row[2]}, int(row[5]), (int(row[6]), int(row[7]))]
             else:
-                g.add_vertex(row[1], {row[2]}, int(row[5].strip()), (int(row[6]), int(row[7])))
+                station[0].add(row[2])
+                station[1] += int(row[5])
+    for name, (lines, usage, position) in stations.items():
+        g.add_vertex(name, lines, usage, position)
+
     with open(lines_file, 'r') as file:
         reader = csv.reader(file)
-        first = True
+        next(reader, None)  # gets around the beginning of the file
         for row in reader:
-            if not first:
-                for i in range(len(row) - 1):
-                    g.add_edge(row[i], row[i + 1])
-            first = False
+            for station1, station2 in zip(row, row[1:]):
+                g.add_edge(station1, station2)
 
     return g
 
@@ -488,11 +731,9 @@ def load_extras(g: Graph, bikeshare_file: str, surface_file: str) -> Graph:
     # bikeshare
     with open(bikeshare_file, 'r') as file:
         reader = csv.reader(file)
-        count = 0
+        next(reader, None)  # gets around the beginning of the file
         for row in reader:
-            if count != 0:  # gets around the beginning of the file
-                g.add_vertex(row[1], {'Bike Share'}, int(row[2]), (0, 0))
-            count += 1
+            g.add_vertex(row[1], {'Bike Share'}, int(row[2]), (0, 0))
 
     # surface
     with open(surface_file, 'r') as file: